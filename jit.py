@@ -0,0 +1,46 @@
+"""
+jit.py
+------
+Optional Numba compilation for the array kernels.
+Numba is slow to import, so a kernel is only compiled (and Numba
+only loaded) when a caller first asks for it.
+
+Author: Your Team
+"""
+
+import functools
+import types
+
+
+def _lazy_njit(kernel, **opts):
+    """
+    Wrap a kernel for compilation on first use.
+
+    Kernels loop with a bare ``prange``; the compiled copy sees it
+    bound to numba.prange, so no module globals are rebound.
+
+    Args:
+        kernel (function): Plain Python kernel
+        **opts: Options passed to numba.njit
+
+    Returns:
+        Zero-argument function returning the compiled kernel, or None
+        if Numba is not installed
+    """
+    @functools.lru_cache(maxsize=None)
+    def compiled():
+        try:
+            import numba
+        except ImportError:
+            return None
+        func = types.FunctionType(
+            kernel.__code__,
+            {**kernel.__globals__, "prange": numba.prange},
+            kernel.__name__,
+            kernel.__defaults__,
+            kernel.__closure__
+        )
+        func.__qualname__ = kernel.__qualname__
+        return numba.njit(**opts)(func)
+
+    return compiled
@@ -8,6 +8,10 @@ green corridor identification.
 Author: Your Team
 """
 
+import numpy as np
+
+from jit import _lazy_njit
+
 # --------------------------------------------------
 # 1. SEPARATE EMERGENCY AND REGULAR VEHICLES
 # --------------------------------------------------
@@ -38,23 +42,36 @@ def separate_vehicles(vehicles):
 # 2. PRIORITY SCORE FOR A ROUTE
 # --------------------------------------------------
 
+def canonical_edge_set(congested_edges):
+    """
+    Canonicalize congested edges for direction-free O(1) lookups.
+
+    Args:
+        congested_edges (iterable of edges)
+
+    Returns:
+        frozenset of frozenset({u, v}); a frozenset input is assumed
+        to be canonical already and is returned as-is
+    """
+    if isinstance(congested_edges, frozenset):
+        return congested_edges
+    return frozenset(frozenset(edge) for edge in congested_edges)
+
+
 def compute_route_priority(route_edges, congested_edges, vehicle_priority):
     """
     Compute priority score for a given route.
 
     Args:
         route_edges (list of edges)
-        congested_edges (list of edges)
+        congested_edges (list of edges or canonical frozenset)
         vehicle_priority (int)
 
     Returns:
         priority_score (float)
     """
-    congestion_penalty = 0
-
-    for edge in route_edges:
-        if edge in congested_edges or (edge[1], edge[0]) in congested_edges:
-            congestion_penalty += 1
+    congested_set = canonical_edge_set(congested_edges)
+    congestion_penalty = sum(1 for edge in route_edges if frozenset(edge) in congested_set)
 
     # Emergency vehicles get amplified priority
     priority_score = vehicle_priority / (1 + congestion_penalty)
@@ -62,31 +79,170 @@ def compute_route_priority(route_edges, congested_edges, vehicle_priority):
     return priority_score
 
 
+# --------------------------------------------------
+# 2B. BATCH ROUTE SCORING
+# --------------------------------------------------
+
+NUMBA_MIN_PENALTY_ROUTE_NODES = 10_000
+
+
+# Only run compiled; _lazy_njit supplies prange
+def _route_penalty_kernel(nodes, offsets, congested_keys, out):
+    for r in prange(offsets.size - 1):
+        penalty = 0
+        for i in range(offsets[r], offsets[r + 1] - 1):
+            a = nodes[i]
+            b = nodes[i + 1]
+            key = (min(a, b) << 32) | max(a, b)
+            j = np.searchsorted(congested_keys, key)
+            if j < congested_keys.size and congested_keys[j] == key:
+                penalty += 1
+        out[r] = penalty
+
+
+_compiled_route_penalty_kernel = _lazy_njit(_route_penalty_kernel, parallel=True, cache=True)
+
+
+def _pack_edge_keys(u, v):
+    """Pack dense node indices into direction-free int64 edge keys."""
+    return (np.minimum(u, v) << 32) | np.maximum(u, v)
+
+
+def _edge_endpoints(edge):
+    """(u, v) of a canonical frozenset edge ({u} for a self-loop)."""
+    u, *rest = edge
+    return u, (rest[0] if rest else u)
+
+
+def _route_penalties_bitmap(routes, congested_edges, edge_table):
+    """
+    Congested-edge count per route via a dense edge-id bitmap.
+
+    Each route edge is looked up once in the edge table's edge_idx;
+    the penalty is then a gather from a uint8 bitmap plus a prefix sum
+    over the CSR route layout. Edges missing from the table map to a
+    sentinel id that is never congested.
+    """
+    edge_idx = edge_table["edge_idx"]
+    sentinel = len(edge_table["edges"])
+
+    bitmap = np.zeros(sentinel + 1, dtype=np.uint8)
+    congested_ids = [
+        edge_idx.get(_edge_endpoints(edge), sentinel)
+        for edge in canonical_edge_set(congested_edges)
+    ]
+    bitmap[congested_ids] = 1
+    bitmap[sentinel] = 0
+
+    counts = np.fromiter((max(len(r) - 1, 0) for r in routes), dtype=np.int64, count=len(routes))
+    offsets = np.zeros(len(routes) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    ids = np.fromiter(
+        (edge_idx.get((r[i], r[i + 1]), sentinel) for r in routes for i in range(len(r) - 1)),
+        dtype=np.int64,
+        count=int(offsets[-1])
+    )
+    hits = np.zeros(ids.size + 1, dtype=np.int64)
+    np.cumsum(bitmap[ids], out=hits[1:])
+
+    return hits[offsets[1:]] - hits[offsets[:-1]]
+
+
+def score_routes_batch(routes, congested_edges, priorities, edge_table=None):
+    """
+    Compute priority scores for many routes at once.
+
+    Same score as compute_route_priority. Routes are packed CSR-style
+    (one node array plus offsets), node ids are mapped to dense
+    indices and every edge becomes one packed int64 key, so congestion
+    is counted against a sorted key array instead of per-edge Python
+    lookups. Large batches use a parallel Numba kernel when Numba is
+    installed, otherwise np.isin. With an edge table, the dense edge
+    ids it already assigns are used with a congestion bitmap instead.
+
+    Args:
+        routes (list of node lists)
+        congested_edges (list of edges or canonical frozenset)
+        priorities (array-like): Vehicle priority for each route
+        edge_table (dict): Optional SoA edge table from network_builder
+
+    Returns:
+        np.ndarray of priority scores
+    """
+    if edge_table is not None:
+        penalties = _route_penalties_bitmap(routes, congested_edges, edge_table)
+        return np.asarray(priorities, dtype=np.float64) / (1 + penalties)
+
+    lengths = np.fromiter((len(r) for r in routes), dtype=np.int64, count=len(routes))
+    offsets = np.zeros(len(routes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    raw_nodes = np.fromiter(
+        (n for r in routes for n in r), dtype=np.int64, count=int(offsets[-1])
+    )
+
+    congested_u = []
+    congested_v = []
+    for edge in canonical_edge_set(congested_edges):
+        u, v = _edge_endpoints(edge)
+        congested_u.append(u)
+        congested_v.append(v)
+
+    # Dense indices keep (lo << 32) | hi collision-free for OSM ids
+    _, dense = np.unique(
+        np.concatenate([raw_nodes, np.array(congested_u + congested_v, dtype=np.int64)]),
+        return_inverse=True
+    )
+    dense = dense.astype(np.int64)
+    nodes = dense[:raw_nodes.size]
+    num_congested = len(congested_u)
+    congested_keys = np.unique(_pack_edge_keys(
+        dense[raw_nodes.size:raw_nodes.size + num_congested],
+        dense[raw_nodes.size + num_congested:]
+    ))
+
+    kernel = _compiled_route_penalty_kernel() if nodes.size >= NUMBA_MIN_PENALTY_ROUTE_NODES else None
+    if kernel is not None:
+        penalties = np.empty(len(routes), dtype=np.int64)
+        kernel(nodes, offsets, congested_keys, penalties)
+    else:
+        # Drop the pseudo-edges that would join consecutive routes
+        route_of_node = np.repeat(np.arange(len(routes)), lengths)
+        same_route = route_of_node[:-1] == route_of_node[1:]
+        hits = np.isin(_pack_edge_keys(nodes[:-1], nodes[1:])[same_route], congested_keys)
+        penalties = np.bincount(
+            route_of_node[:-1][same_route], weights=hits, minlength=len(routes)
+        )
+
+    # Emergency vehicles get amplified priority
+    return np.asarray(priorities, dtype=np.float64) / (1 + penalties)
+
+
 # --------------------------------------------------
 # 3. RANK ROUTES BASED ON PRIORITY
 # --------------------------------------------------
 
-def rank_vehicle_routes(vehicle, congested_edges):
+def rank_vehicle_routes(vehicle, congested_edges, edge_table=None):
     """
     Rank candidate routes for a vehicle.
 
     Args:
         vehicle (dict)
         congested_edges (list)
+        edge_table (dict): Optional SoA edge table from network_builder
 
     Returns:
         sorted_routes (list)
     """
-    ranked_routes = []
-
-    for route in vehicle["candidate_routes"]:
-        route_edges = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
-        score = compute_route_priority(
-            route_edges,
-            congested_edges,
-            vehicle["priority_weight"]
-        )
-        ranked_routes.append((route, score))
+    routes = vehicle["candidate_routes"]
+    scores = score_routes_batch(
+        routes,
+        congested_edges,
+        np.full(len(routes), vehicle["priority_weight"], dtype=np.float64),
+        edge_table=edge_table
+    )
+    ranked_routes = list(zip(routes, scores.tolist()))
 
     # Sort routes by descending priority score
     ranked_routes.sort(key=lambda x: x[1], reverse=True)
@@ -98,24 +254,36 @@ def rank_vehicle_routes(vehicle, congested_edges):
 # 4. SELECT PREFERRED ROUTE FOR EACH VEHICLE
 # --------------------------------------------------
 
-def select_preferred_routes(vehicles, congested_edges):
+def select_preferred_routes(vehicles, congested_edges, edge_table=None):
     """
     Select best route for each vehicle based on priority.
 
     Args:
         vehicles (list of dicts)
         congested_edges (list)
+        edge_table (dict): Optional SoA edge table from network_builder
 
     Returns:
         selected_routes (dict)
     """
     selected_routes = {}
 
+    # Score every vehicle's candidates in a single batch
+    all_routes = [r for v in vehicles for r in v["candidate_routes"]]
+    priorities = [v["priority_weight"] for v in vehicles for _ in v["candidate_routes"]]
+    scores = score_routes_batch(
+        all_routes, congested_edges, priorities, edge_table=edge_table
+    ).tolist()
+
+    start = 0
     for vehicle in vehicles:
-        ranked = rank_vehicle_routes(vehicle, congested_edges)
+        routes = vehicle["candidate_routes"]
+        vehicle_scores = scores[start:start + len(routes)]
+        start += len(routes)
 
-        if ranked:
-            selected_routes[vehicle["vehicle_id"]] = ranked[0][0]
+        if routes:
+            best = max(range(len(routes)), key=vehicle_scores.__getitem__)
+            selected_routes[vehicle["vehicle_id"]] = routes[best]
         else:
             selected_routes[vehicle["vehicle_id"]] = None
 
@@ -132,18 +300,19 @@ def identify_emergency_corridor(emergency_vehicles, congested_edges):
 
     Args:
         emergency_vehicles (list)
-        congested_edges (list)
+        congested_edges (list or canonical frozenset)
 
     Returns:
         corridor_edges (set)
     """
     corridor_edges = set()
+    congested_set = canonical_edge_set(congested_edges)
 
     for v in emergency_vehicles:
         for route in v.get("candidate_routes", []):
             for i in range(len(route) - 1):
                 edge = (route[i], route[i + 1])
-                if edge not in congested_edges and (edge[1], edge[0]) not in congested_edges:
+                if frozenset(edge) not in congested_set:
                     corridor_edges.add(edge)
 
     return corridor_edges
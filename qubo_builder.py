@@ -9,6 +9,7 @@ Author: Your Team
 """
 
 import dimod
+import numpy as np
 from collections import defaultdict
 
 
@@ -21,17 +22,22 @@ def create_qubo_variables(vehicles):
     Create binary decision variables for each vehicle-route pair.
 
     Variable format:
-        x_(vehicle_id)_(route_index)
+        vehicle_id * max_routes + route_index
+
+    Integer labels hash faster and take less memory in the BQM than
+    "x_{vid}_{r}" strings. Decoders should invert variable_map rather
+    than rely on this scheme.
 
     Returns:
         variable_map (dict)
     """
+    max_routes = max((len(v["candidate_routes"]) for v in vehicles), default=0) or 1
+
     variable_map = {}
     for v in vehicles:
         vid = v["vehicle_id"]
         for r_idx in range(len(v["candidate_routes"])):
-            var_name = f"x_{vid}_{r_idx}"
-            variable_map[(vid, r_idx)] = var_name
+            variable_map[(vid, r_idx)] = vid * max_routes + r_idx
     return variable_map
 
 
@@ -41,76 +47,117 @@ def create_qubo_variables(vehicles):
 
 def build_qubo(vehicles, variable_map, congestion_weight=1.0):
     """
-    Construct the QUBO dictionary.
+    Construct the QUBO in coordinate (COO) form.
 
     Objective:
     - Each vehicle selects exactly one route
     - Minimize congestion overlap
     - Prioritize emergency vehicles
 
+    OPTIMIZED: coefficients are written into preallocated NumPy
+    arrays indexed by dense variable position (the order of
+    variable_map) instead of a dict keyed by label pairs. Duplicate
+    (row, col) entries are summed when the BQM is built.
+
     Returns:
-        Q (dict)
+        Q (tuple): (rows, cols, vals) arrays
     """
-    Q = defaultdict(float)
+    index = {key: i for i, key in enumerate(variable_map)}
+
+    # Which (variable, priority) pairs use each road segment
+    edge_usage = defaultdict(list)
 
-    # --------------------------------------------------
-    # Constraint 1: Each vehicle selects exactly ONE route
-    # --------------------------------------------------
     for v in vehicles:
         vid = v["vehicle_id"]
-        route_indices = range(len(v["candidate_routes"]))
+        priority = v["priority_weight"]
 
-        for i in route_indices:
-            var_i = variable_map[(vid, i)]
-            Q[(var_i, var_i)] += -2  # linear term
+        for r_idx, route in enumerate(v["candidate_routes"]):
+            edges = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
+            for edge in edges:
+                edge_usage[edge].append((index[(vid, r_idx)], priority))
 
-            for j in route_indices:
-                if i != j:
-                    var_j = variable_map[(vid, j)]
-                    Q[(var_i, var_j)] += 2  # quadratic penalty
+    nnz = (
+        sum(len(v["candidate_routes"]) ** 2 for v in vehicles)
+        + sum(len(users) * (len(users) - 1) // 2 for users in edge_usage.values())
+    )
+    rows = np.empty(nnz, dtype=np.int32)
+    cols = np.empty(nnz, dtype=np.int32)
+    vals = np.empty(nnz, dtype=np.float64)
+    n = 0
 
     # --------------------------------------------------
-    # Constraint 2: Congestion minimization (route overlap)
+    # Constraint 1: Each vehicle selects exactly ONE route
     # --------------------------------------------------
-    edge_usage = defaultdict(list)
-
     for v in vehicles:
         vid = v["vehicle_id"]
-        priority = v["priority_weight"]
+        route_vars = np.array(
+            [index[(vid, r_idx)] for r_idx in range(len(v["candidate_routes"]))],
+            dtype=np.int32
+        )
+        size = route_vars.size ** 2
+
+        rows[n:n + size] = np.repeat(route_vars, route_vars.size)
+        cols[n:n + size] = np.tile(route_vars, route_vars.size)
+        # -2 linear term on the diagonal, +2 quadratic penalty elsewhere
+        vals[n:n + size] = np.where(rows[n:n + size] == cols[n:n + size], -2.0, 2.0)
+        n += size
 
-        for r_idx, route in enumerate(v["candidate_routes"]):
-            edges = [(route[i], route[i + 1]) for i in range(len(route) - 1)]
-            for edge in edges:
-                edge_usage[edge].append((vid, r_idx, priority))
+    # --------------------------------------------------
+    # Constraint 2: Congestion minimization (route overlap)
+    # --------------------------------------------------
+    # Pairwise penalties per shared edge come from one outer sum over
+    # the users' inverse priorities; the strict upper triangle gives
+    # each unordered pair once, in the same order as a nested i < j loop.
+    pair_indices = {}
 
     for edge, users in edge_usage.items():
-        if len(users) > 1:
-            for i in range(len(users)):
-                for j in range(i + 1, len(users)):
-                    vid1, r1, p1 = users[i]
-                    vid2, r2, p2 = users[j]
+        k = len(users)
+        if k > 1:
+            if k not in pair_indices:
+                pair_indices[k] = np.triu_indices(k, 1)
+            iu, iv = pair_indices[k]
 
-                    var1 = variable_map[(vid1, r1)]
-                    var2 = variable_map[(vid2, r2)]
+            var_idx = np.fromiter((u[0] for u in users), dtype=np.int32, count=k)
+            inv_p = 1.0 / np.fromiter((u[1] for u in users), dtype=np.float64, count=k)
+            P = np.add.outer(inv_p, inv_p) * congestion_weight
 
-                    penalty = congestion_weight * (1 / p1 + 1 / p2)
-                    Q[(var1, var2)] += penalty
+            m = iu.size
+            rows[n:n + m] = var_idx[iu]
+            cols[n:n + m] = var_idx[iv]
+            vals[n:n + m] = P[iu, iv]
+            n += m
 
-    return Q
+    return rows, cols, vals
 
 
 # --------------------------------------------------
 # 3. BUILD BINARY QUADRATIC MODEL (BQM)
 # --------------------------------------------------
 
-def build_bqm(Q):
+def build_bqm(Q, variable_map):
     """
-    Convert QUBO dictionary into BinaryQuadraticModel.
+    Convert COO QUBO arrays into a BinaryQuadraticModel.
+
+    Diagonal entries become linear biases; dimod sums duplicate
+    off-diagonal entries, as from_qubo did for the dict form.
 
     Returns:
         bqm (BinaryQuadraticModel)
     """
-    bqm = dimod.BinaryQuadraticModel.from_qubo(Q)
+    rows, cols, vals = Q
+    labels = list(variable_map.values())
+
+    diagonal = rows == cols
+    linear = np.bincount(rows[diagonal], weights=vals[diagonal], minlength=len(labels))
+
+    off = ~diagonal
+    bqm = dimod.BinaryQuadraticModel.from_numpy_vectors(
+        linear,
+        (rows[off], cols[off], vals[off]),
+        0.0,
+        dimod.BINARY,
+        variable_order=labels
+    )
     return bqm
 
 
@@ -127,6 +174,6 @@ def build_priority_aware_qubo(vehicles):
     """
     variable_map = create_qubo_variables(vehicles)
     Q = build_qubo(vehicles, variable_map)
-    bqm = build_bqm(Q)
+    bqm = build_bqm(Q, variable_map)
 
     return bqm, variable_map
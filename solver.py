@@ -8,25 +8,78 @@ Author: Your Team
 """
 
 import dimod
+import numpy as np
 
 
 # --------------------------------------------------
 # 1. SOLVE USING SIMULATED ANNEALING (LOCAL)
 # --------------------------------------------------
 
-def solve_with_simulated_annealing(bqm, num_reads=100):
+def _annealing_sampler():
+    """
+    Fastest available simulated annealing sampler.
+
+    Prefers D-Wave's compiled samplers (dwave-samplers, or the older
+    dwave-neal package); falls back to dimod's pure-Python reference
+    implementation when neither is installed.
+
+    Returns:
+        sampler, compiled (bool)
+    """
+    try:
+        from dwave.samplers import SimulatedAnnealingSampler
+        return SimulatedAnnealingSampler(), True
+    except ImportError:
+        pass
+
+    try:
+        from neal import SimulatedAnnealingSampler
+        return SimulatedAnnealingSampler(), True
+    except ImportError:
+        return dimod.SimulatedAnnealingSampler(), False
+
+
+def annealing_beta_range(bqm):
+    """
+    Inverse-temperature range matched to the QUBO coefficient scale.
+
+    Hot end: the largest coefficient is flipped against with
+    probability 1/2; cold end: the smallest one with probability 1/100.
+
+    Returns:
+        (beta_min, beta_max) or None for an empty model
+    """
+    linear, (_, _, quadratic), _ = bqm.to_numpy_vectors()
+    biases = np.abs(np.concatenate([linear, quadratic]))
+    biases = biases[biases > 0]
+    if biases.size == 0:
+        return None
+
+    return np.log(2) / biases.max(), np.log(100) / biases.min()
+
+
+def solve_with_simulated_annealing(bqm, num_reads=100, num_sweeps=1000):
     """
     Solve the QUBO using classical Simulated Annealing.
 
     Args:
         bqm (BinaryQuadraticModel)
         num_reads (int)
+        num_sweeps (int)
 
     Returns:
         best_sample (dict)
     """
-    sampler = dimod.SimulatedAnnealingSampler()
-    sampleset = sampler.sample(bqm, num_reads=num_reads)
+    sampler, compiled = _annealing_sampler()
+
+    params = {"num_reads": num_reads, "num_sweeps": num_sweeps}
+    beta_range = annealing_beta_range(bqm)
+    if beta_range is not None:
+        params["beta_range"] = beta_range
+    if compiled:
+        params["beta_schedule_type"] = "geometric"
+
+    sampleset = sampler.sample(bqm, **params)
 
     best_sample = sampleset.first.sample
     return best_sample
@@ -36,20 +89,84 @@ def solve_with_simulated_annealing(bqm, num_reads=100):
 # 2. SOLVE USING EXACT SOLVER (SMALL PROBLEMS ONLY)
 # --------------------------------------------------
 
+def brute_force_qubo(Q):
+    """
+    Find the minimum of x^T Q x over all binary vectors x.
+
+    States are enumerated in Gray-code order, so consecutive states
+    differ in one bit and the energy is updated incrementally from
+    that bit's row: O(2^n * n) instead of O(2^n * n^2).
+
+    Args:
+        Q (np.ndarray): Symmetric n x n QUBO matrix
+
+    Returns:
+        x_min (np.ndarray), v_min (float)
+    """
+    Q = np.asarray(Q, dtype=float)
+    n = Q.shape[0]
+
+    x = np.zeros(n)
+    x_min = x.copy()
+    v = 0.0
+    v_min = 0.0
+
+    for k in range(1, 1 << n):
+        # Gray code k flips the lowest set bit of k
+        i = (k ^ (k - 1)).bit_count() - 1
+        delta = (1 - 2 * x[i]) * (
+            Q[i, i] + 2 * (Q[i, :i] @ x[:i]) + 2 * (Q[i + 1:, i] @ x[i + 1:])
+        )
+        x[i] = 1 - x[i]
+        v += delta
+        if v < v_min:
+            v_min = v
+            x_min[:] = x
+
+    return x_min, v_min
+
+
+# dimod.ExactSolver keeps every state in memory (2^n rows); above this
+# many variables solve_exact enumerates with brute_force_qubo instead
+EXACT_SOLVER_MAX_VARIABLES = 20
+
+
 def solve_exact(bqm):
     """
     Solve QUBO exactly (only for very small problems).
 
+    Uses dimod.ExactSolver; beyond EXACT_SOLVER_MAX_VARIABLES, where
+    its state table gets too large, falls back to the O(n)-memory
+    Gray-code enumeration in brute_force_qubo.
+
     Args:
         bqm (BinaryQuadraticModel)
 
     Returns:
         best_sample (dict)
     """
-    sampler = dimod.ExactSolver()
-    sampleset = sampler.sample(bqm)
+    if len(bqm.variables) <= EXACT_SOLVER_MAX_VARIABLES:
+        sampler = dimod.ExactSolver()
+        sampleset = sampler.sample(bqm)
 
-    best_sample = sampleset.first.sample
+        best_sample = sampleset.first.sample
+        return best_sample
+
+    bqm = bqm.change_vartype(dimod.BINARY, inplace=False)
+    labels = list(bqm.variables)
+    index = {label: i for i, label in enumerate(labels)}
+
+    # Symmetric matrix: diagonal = linear biases, off-diagonal = J / 2
+    Q = np.zeros((len(labels), len(labels)))
+    for label, bias in bqm.linear.items():
+        Q[index[label], index[label]] = bias
+    for (u, v), bias in bqm.quadratic.items():
+        Q[index[u], index[v]] += bias / 2
+        Q[index[v], index[u]] += bias / 2
+
+    x_min, _ = brute_force_qubo(Q)
+
+    best_sample = {label: int(value) for label, value in zip(labels, x_min)}
     return best_sample
 
 
@@ -94,8 +211,14 @@ def decode_solution(sample, variable_map, vehicles):
     """
     selected_routes = {}
 
-    for (vid, r_idx), var_name in variable_map.items():
-        if sample.get(var_name, 0) == 1:
+    # Reverse lookup label -> (vehicle_id, route_index), so only the
+    # sample's variables are visited and the labelling scheme stays
+    # qubo_builder's business
+    pairs = {var: pair for pair, var in variable_map.items()}
+
+    for var, value in sample.items():
+        if value == 1 and var in pairs:
+            vid, r_idx = pairs[var]
             selected_routes[vid] = vehicles[vid]["candidate_routes"][r_idx]
 
     return selected_routes
@@ -9,6 +9,10 @@ Author: Your Team
 
 import random
 
+import numpy as np
+
+from network_builder import routes_to_edges
+
 
 # --------------------------------------------------
 # 1. CREATE VEHICLES (REGULAR + EMERGENCY)
@@ -48,7 +52,11 @@ def generate_vehicles(od_pairs, emergency_ratio=0.2):
 
 def assign_routes_to_vehicles(vehicles, routes_dict):
     """
-    Attach candidate routes to each vehicle.
+    Attach candidate routes (and their edges) to each vehicle.
+
+    Edges are computed once here so downstream consumers (e.g.
+    visualization) don't rebuild them on every redraw. They are stored
+    as the flat (edges, offsets) pair from routes_to_edges.
 
     Args:
         vehicles (list of dicts)
@@ -60,6 +68,7 @@ def assign_routes_to_vehicles(vehicles, routes_dict):
     for vehicle in vehicles:
         od_key = (vehicle["origin"], vehicle["destination"])
         vehicle["candidate_routes"] = routes_dict.get(od_key, [])
+        vehicle["candidate_route_edges"] = routes_to_edges(vehicle["candidate_routes"])
 
     return vehicles
 
@@ -68,24 +77,38 @@ def assign_routes_to_vehicles(vehicles, routes_dict):
 # 3. TAG CONGESTED EDGES
 # --------------------------------------------------
 
-def identify_congested_edges(G, congestion_threshold=7):
+def identify_congested_edges(G, congestion_threshold=7, edge_table=None, roadnet=None):
     """
     Identify heavily congested road segments.
 
     Args:
         G (networkx.Graph)
         congestion_threshold (int)
+        edge_table (dict): Optional SoA edge table from network_builder;
+            when given, the congestion array is scanned instead of G
+        roadnet (RoadNet): Optional SoA network from network_builder;
+            takes precedence over edge_table
 
     Returns:
-        List of congested edges
+        frozenset of congested edges, each a frozenset({u, v}) so
+        membership checks ignore direction
     """
+    if roadnet is not None:
+        hot = roadnet.edges[roadnet.congested_edge_ids(congestion_threshold)]
+        return frozenset(frozenset(pair) for pair in roadnet.nodes[hot].tolist())
+
+    if edge_table is not None:
+        edges = edge_table["edges"]
+        hot = np.flatnonzero(edge_table["congestion"] >= congestion_threshold)
+        return frozenset(frozenset(edges[i]) for i in hot)
+
     congested_edges = []
 
     for u, v, data in G.edges(data=True):
         if data.get("congestion", 0) >= congestion_threshold:
-            congested_edges.append((u, v))
+            congested_edges.append(frozenset((u, v)))
 
-    return congested_edges
+    return frozenset(congested_edges)
 
 
 # --------------------------------------------------
@@ -109,12 +132,17 @@ def build_traffic_scenario(network_data, emergency_ratio=0.2):
 
     vehicles = generate_vehicles(od_pairs, emergency_ratio)
     vehicles = assign_routes_to_vehicles(vehicles, routes)
-    congested_edges = identify_congested_edges(G)
+    congested_edges = identify_congested_edges(
+        G,
+        edge_table=network_data.get("edge_table"),
+        roadnet=network_data.get("roadnet")
+    )
 
     scenario = {
         "graph": G,
         "vehicles": vehicles,
-        "congested_edges": congested_edges
+        "congested_edges": congested_edges,
+        "roadnet": network_data.get("roadnet")
     }
 
     return scenario
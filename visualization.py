@@ -1,44 +1,472 @@
-import matplotlib.pyplot as plt
+import matplotlib
 import networkx as nx
+import numpy as np
+from matplotlib.collections import LineCollection
 
+from jit import _lazy_njit
 
-def visualize_traffic(G, regular_routes, emergency_routes):
-    pos = nx.spring_layout(G, seed=42)
+LBFGS_MIN_NODES = 500
+BARNES_HUT_MIN_NODES = 2000
 
-    fig, ax = plt.subplots(figsize=(10, 8))
+# Matplotlib's "fast" style settings: drop sub-pixel vertices before
+# rasterizing and let Agg render long paths in chunks. Output differs
+# from the defaults by at most a sub-pixel. Applied with rc_context
+# around our own building/drawing so the process-wide defaults are
+# left alone; the simplify settings are captured when paths are built.
+_FAST_RC = {
+    "path.simplify": True,
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10000,
+}
 
-    # Base graph
-    nx.draw(
-        G, pos,
-        node_size=5,
-        edge_color="lightgray",
-        with_labels=False,
-        ax=ax
+
+def _lbfgs_layout(G, iterations=50, seed=42, batch_size=500):
+    # Fruchterman-Reingold energy minimised with L-BFGS instead of the
+    # fixed-step cooling loop used by spring_layout
+    import scipy as sp
+
+    nodes = list(G.nodes())
+    n = len(nodes)
+    if n < 3:
+        return nx.spring_layout(G, seed=seed)
+
+    # Sparse adjacency keeps memory O(E) for large road graphs
+    A = sp.sparse.csr_array(nx.to_scipy_sparse_array(G, nodelist=nodes, weight=None))
+    A = (A + A.T) / 2
+    k = np.sqrt(1.0 / n)
+    x0 = np.random.default_rng(seed).random((n, 2))
+
+    def energy(x):
+        pos = x.reshape((n, 2))
+        grad = np.zeros((n, 2))
+        cost = 0.0
+        for lo in range(0, n, batch_size):
+            hi = min(lo + batch_size, n)
+            delta = pos[lo:hi, np.newaxis, :] - pos[np.newaxis, :, :]
+            dist2 = np.maximum(np.sum(delta * delta, axis=2), 1e-10)
+            dist = np.sqrt(dist2)
+            Ad = A[lo:hi].toarray() * dist
+            grad[lo:hi] = 2 * np.einsum("ij,ijk->ik", Ad / k - k**2 / dist2, delta)
+            cost += np.sum(Ad * dist2) / (3 * k)
+            cost -= k**2 * np.sum(np.log(dist))
+        # Weak pull towards the centre keeps disconnected pieces on screen
+        centre = pos.mean(axis=0) - 0.5
+        grad += centre
+        cost += 0.5 * n * np.dot(centre, centre)
+        return cost, grad.ravel()
+
+    result = sp.optimize.minimize(
+        energy, x0.ravel(), method="L-BFGS-B", jac=True,
+        options={"maxiter": iterations, "gtol": 1e-4}
     )
+    coords = nx.rescale_layout(result.x.reshape((n, 2)))
+    return dict(zip(nodes, coords))
+
+
+def _cell_keys(unit, level):
+    cell = (unit * 2**level).astype(np.int64)
+    return cell[:, 0] * 2**level + cell[:, 1]
+
+
+def _barnes_hut_layout(G, iterations=100, seed=42, leaf_size=4, max_depth=16):
+    # Fruchterman-Reingold with Barnes-Hut repulsion over a quadtree built
+    # level by level: at each level a cell feels the centre of mass of
+    # the children of its parent's neighbours that are not its own
+    # neighbours, and only nodes in adjacent leaf cells (cKDTree pair
+    # query) interact exactly. O(V log V) per iteration instead of
+    # O(V^2); linear cooling as in spring_layout
+    from scipy.spatial import cKDTree
+
+    nodes = list(G.nodes())
+    n = len(nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array(
+        [(node_index[u], node_index[v]) for u, v in G.edges() if u != v], dtype=np.int64
+    ).reshape((-1, 2))
+    u, v = edges[:, 0], edges[:, 1]
+
+    # The 6x6 block of children of a cell's parent and its neighbours
+    block = np.stack(np.meshgrid(np.arange(6), np.arange(6), indexing="ij"), axis=2).reshape(-1, 2)
+
+    k = np.sqrt(1.0 / n)
+    pos = np.random.default_rng(seed).random((n, 2))
+    t = 0.1
+    dt = t / (iterations + 1)
+
+    for _ in range(iterations):
+        lo = pos.min(axis=0)
+        span = max(np.max(pos.max(axis=0) - lo), 1e-9)
+        unit = np.minimum((pos - lo) / span, 1 - 1e-12)
+
+        # Leaves: split until cells hold about leaf_size nodes each
+        depth = 2
+        while depth < max_depth and len(np.unique(_cell_keys(unit, depth))) * leaf_size < n:
+            depth += 1
+        disp = np.zeros((n, 2))
+
+        # Far field, one tree level at a time
+        for level in range(2, depth + 1):
+            occupied, cell_id = np.unique(_cell_keys(unit, level), return_inverse=True)
+            mass = np.bincount(cell_id).astype(float)
+            centroid = np.stack(
+                [np.bincount(cell_id, pos[:, axis]) / mass for axis in range(2)], axis=1
+            )
+
+            # Cells stand in for their nodes too, so each level costs
+            # O(cells) rather than O(V)
+            cell = np.stack(np.divmod(occupied, 2**level), axis=1)
+            near = (cell // 2 * 2 - 2)[:, np.newaxis, :] + block
+            wanted = (
+                (np.abs(near - cell[:, np.newaxis, :]).max(axis=2) > 1)
+                & (near >= 0).all(axis=2)
+                & (near < 2**level).all(axis=2)
+            )
+            keys = near[:, :, 0] * 2**level + near[:, :, 1]
+            j = np.minimum(np.searchsorted(occupied, keys), len(occupied) - 1)
+            wanted &= occupied[j] == keys
+
+            d = centroid[:, np.newaxis, :] - centroid[j]
+            weight = np.divide(
+                mass[j] * k**2, np.sum(d * d, axis=2), out=np.zeros(j.shape), where=wanted
+            )
+            disp += np.einsum("ij,ijk->ik", weight, d)[cell_id]
+
+        # Near field: exact repulsion k^2 / d between adjacent leaves
+        cell = (unit * 2**depth).astype(np.int64)
+        pairs = cKDTree(pos).query_pairs(2 * span / 2**depth, p=np.inf, output_type="ndarray")
+        pairs = pairs[np.abs(cell[pairs[:, 0]] - cell[pairs[:, 1]]).max(axis=1) <= 1]
+        i, j = pairs[:, 0], pairs[:, 1]
+        delta = pos[i] - pos[j]
+        push = delta * (k**2 / np.maximum(np.sum(delta * delta, axis=1), 1e-10))[:, np.newaxis]
+
+        # Attraction d^2 / k along edges
+        delta_e = pos[u] - pos[v]
+        pull = delta_e * (np.sqrt(np.sum(delta_e * delta_e, axis=1)) / k)[:, np.newaxis]
+
+        for axis in range(2):
+            disp[:, axis] += np.bincount(i, push[:, axis], n) - np.bincount(j, push[:, axis], n)
+            disp[:, axis] -= np.bincount(u, pull[:, axis], n) - np.bincount(v, pull[:, axis], n)
+
+        # Move at most t per step
+        length = np.maximum(np.sqrt(np.sum(disp * disp, axis=1)), 0.01)
+        pos += disp * (t / length)[:, np.newaxis]
+        t -= dt
+
+    return dict(zip(nodes, nx.rescale_layout(pos)))
+
+
+def compute_layout(G):
+    # OSM nodes carry lon/lat; only simulate a layout when they are missing
+    pos = {n: (d["x"], d["y"]) for n, d in G.nodes(data=True) if "x" in d and "y" in d}
+    if pos and len(pos) == len(G):
+        return pos
+    pos = nx.get_node_attributes(G, "pos")
+    if pos and len(pos) == len(G):
+        return pos
+    # Connected graphs: one (sparse, for large G) eigensolve instead of
+    # an iterative force simulation. Spectral layouts collapse separate
+    # components onto each other, so those still use a force layout.
+    if G.number_of_nodes() > 2 and not G.is_directed() and nx.is_connected(G):
+        return nx.spectral_layout(G)
+    # L-BFGS pays off where spring_layout switches to its slow sparse
+    # solver; below that the dense spring_layout converges quickly.
+    # Its exact repulsion is still O(V^2), so large graphs approximate it.
+    if G.number_of_nodes() >= BARNES_HUT_MIN_NODES:
+        return _barnes_hut_layout(G)
+    if G.number_of_nodes() > LBFGS_MIN_NODES:
+        return _lbfgs_layout(G)
+    return nx.spring_layout(G, seed=42)
+
+
+def _cached_layout(G):
+    # Kept on G (checked against its size) so repeated renders of the
+    # same graph (animation frames) skip the layout step, and the entry
+    # is dropped together with the graph
+    sig = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get("_layout_sig") != sig:
+        G.graph["_layout"] = compute_layout(G)
+        G.graph["_layout_sig"] = sig
+    return G.graph["_layout"]
+
+
+def _position_table(G, pos):
+    # Node -> row lookup plus an (N, 2) coordinate array to gather from;
+    # built once per graph and layout, then kept on G (with the layout,
+    # matched by identity) like the segments
+    sig = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get("_pos_table_pos") is not pos or G.graph.get("_pos_table_sig") != sig:
+        nodes = list(G.nodes())
+        node_index = {n: i for i, n in enumerate(nodes)}
+        # float32 halves the bytes pushed through the segment/transform
+        # pipeline; ~1 m precision at lon/lat scale is far below a pixel
+        pos_arr = np.array([pos[n] for n in nodes], dtype=np.float32).reshape((-1, 2))
+        G.graph["_pos_table"] = (node_index, pos_arr)
+        G.graph["_pos_table_pos"] = pos
+        G.graph["_pos_table_sig"] = sig
+    return G.graph["_pos_table"]
+
+
+def _edge_indices(node_index, edges):
+    # (N, 2) row indices of edge endpoints
+    idx = np.fromiter(map(node_index.__getitem__, (n for edge in edges for n in edge)), dtype=np.int32)
+    return idx.reshape((-1, 2))
+
+
+# Below this many route nodes the NumPy mask beats the JIT call overhead
+NUMBA_MIN_OVERLAY_ROUTE_NODES = 100_000
+
+
+# Only run compiled; _lazy_njit supplies prange
+def _route_pairs_kernel(flat_idx, offsets, out):
+    for r in prange(offsets.size - 1):
+        start = offsets[r]
+        end = offsets[r + 1]
+        # Route r's first edge row: nodes before it minus one per earlier route
+        row = start - r
+        for i in range(start, end - 1):
+            out[row, 0] = flat_idx[i]
+            out[row, 1] = flat_idx[i + 1]
+            row += 1
+
+
+_compiled_route_pairs_kernel = _lazy_njit(_route_pairs_kernel, parallel=True, cache=True)
+
 
-    # Regular routes (blue)
-    for route in regular_routes:
-        edges = [(route[i], route[i+1]) for i in range(len(route)-1)]
-        nx.draw_networkx_edges(
-            G, pos,
-            edgelist=edges,
-            edge_color="blue",
-            width=2,
-            alpha=0.6,
-            ax=ax
+def _route_indices(node_index, routes):
+    # Consecutive-node pairs from one flat index array for all routes,
+    # no per-route Python work beyond the node lookup
+    lengths = np.fromiter((len(route) for route in routes), dtype=np.int64, count=len(routes))
+    # int32 rows: half the bytes of int64 for every gather below
+    flat_idx = np.fromiter(
+        map(node_index.__getitem__, (n for route in routes for n in route)),
+        dtype=np.int32,
+        count=int(lengths.sum())
+    )
+
+    # Empty routes would break the "one fewer edge per route" row math
+    lengths = lengths[lengths > 0]
+    offsets = np.zeros(lengths.size + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    kernel = _compiled_route_pairs_kernel() if flat_idx.size >= NUMBA_MIN_OVERLAY_ROUTE_NODES else None
+    if kernel is not None:
+        out = np.empty((flat_idx.size - lengths.size, 2), dtype=np.int32)
+        kernel(flat_idx, offsets, out)
+        return out
+
+    # Drop the pairs that straddle two routes
+    keep = np.ones(max(flat_idx.size - 1, 0), dtype=bool)
+    keep[offsets[1:-1] - 1] = False
+    return np.stack((flat_idx[:-1], flat_idx[1:]), axis=1)[keep]
+
+
+def _unique_edges(idx):
+    # Undirected edges shared by several routes are drawn once; counts
+    # say how many routes use each
+    if len(idx) == 0:
+        return idx, np.empty(0, dtype=np.int64)
+    # One int64 key per edge: a flat unique is much faster than
+    # np.unique(axis=0) and gives the same (lexicographic) order
+    idx = np.sort(idx, axis=1).astype(np.int64)
+    keys, counts = np.unique((idx[:, 0] << 32) | idx[:, 1], return_counts=True)
+    return np.stack((keys >> 32, keys & 0xFFFFFFFF), axis=1).astype(np.int32), counts
+
+
+def _segments(pos_arr, idx):
+    # (N, 2, 2) array of edge endpoint coordinates for a LineCollection
+    return np.stack((pos_arr[idx[:, 0]], pos_arr[idx[:, 1]]), axis=1)
+
+
+def _base_segments(G, pos, node_index, pos_arr):
+    # The road segments only change with the graph or the layout, so
+    # they are kept on G and reused across frames / reruns. The layout
+    # itself is kept too and matched by identity: an id() alone can be
+    # recycled by a new dict once the old one is freed.
+    sig = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get("_edge_seg_pos") is not pos or G.graph.get("_edge_seg_sig") != sig:
+        G.graph["_edge_segments"] = _segments(pos_arr, _edge_indices(node_index, G.edges()))
+        G.graph["_edge_seg_pos"] = pos
+        G.graph["_edge_seg_sig"] = sig
+    return G.graph["_edge_segments"]
+
+
+def _render_base_only(G, pos):
+    # Headless render of the bare network, kept on G like the base
+    # segments (layout matched by identity); read-only so callers
+    # cannot alter the cached frame
+    sig = (G.number_of_nodes(), G.number_of_edges())
+    if G.graph.get("_base_pixels_pos") is not pos or G.graph.get("_base_pixels_sig") != sig:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=(10, 8), dpi=150)
+        FigureCanvasAgg(fig)
+        # Drawing into our own axes bypasses the short-circuit
+        pixels = visualize_traffic(G, [], [], pos=pos, ax=fig.add_subplot(111), fast=True).copy()
+        pixels.setflags(write=False)
+        G.graph["_base_pixels"] = pixels
+        G.graph["_base_pixels_pos"] = pos
+        G.graph["_base_pixels_sig"] = sig
+    return G.graph["_base_pixels"]
+
+
+def _route_overlay(node_index, pos_arr, regular_routes, emergency_routes,
+                   regular_edges=None, emergency_edges=None):
+    # Segments, RGBA colours and widths for the single routes
+    # LineCollection; emergency segments come last so they draw on top.
+    # Roads used by several regular vehicles are drawn thicker.
+    # Callers may pass edge lists precomputed in the scenario
+    if regular_edges is None:
+        regular_idx = _route_indices(node_index, regular_routes)
+    else:
+        regular_idx = _edge_indices(node_index, regular_edges)
+    if emergency_edges is None:
+        emergency_idx = _route_indices(node_index, emergency_routes)
+    else:
+        emergency_idx = _edge_indices(node_index, emergency_edges)
+
+    regular_idx, regular_counts = _unique_edges(regular_idx)
+    emergency_idx, _ = _unique_edges(emergency_idx)
+
+    colors = np.empty((len(regular_idx) + len(emergency_idx), 4))
+    colors[:len(regular_idx)] = matplotlib.colors.to_rgba("blue", 0.6)
+    colors[len(regular_idx):] = matplotlib.colors.to_rgba("green")
+    segments = np.concatenate([_segments(pos_arr, regular_idx), _segments(pos_arr, emergency_idx)])
+    widths = np.concatenate([2 * np.sqrt(regular_counts), np.full(len(emergency_idx), 3.0)])
+    return segments, colors, widths
+
+
+def _draw_base(ax, G, pos, node_index, pos_arr):
+    # Base graph: one LineCollection for all roads and one scatter for
+    # all nodes, instead of nx.draw's per-edge artist machinery
+    base = ax.add_collection(LineCollection(
+        _base_segments(G, pos, node_index, pos_arr),
+        colors="lightgray",
+        linewidths=1,
+        zorder=1
+    ))
+    nodes = ax.scatter(pos_arr[:, 0], pos_arr[:, 1], s=5, c="#1f77b4", zorder=2)
+    ax.set_axis_off()
+    return [base, nodes]
+
+
+def visualize_traffic(G, regular_routes, emergency_routes, pos=None,
+                      regular_edges=None, emergency_edges=None, ax=None, fast=False):
+    # fast=True is the headless path: no pyplot, no title, and an RGBA
+    # pixel array (H, W, 4) is returned instead of the figure
+    # Layout is the dominant cost; callers can pass one in, otherwise
+    # it is computed once per graph and reused
+    if pos is None:
+        pos = _cached_layout(G)
+
+    # Nothing to overlay (e.g. warmup, no emergency vehicles): skip the
+    # route work, and headless renders reuse the pixels of the last one
+    has_routes = any(
+        items is not None and len(items) > 0
+        for items in (regular_routes, emergency_routes, regular_edges, emergency_edges)
+    )
+    if not has_routes and fast and ax is None:
+        return _render_base_only(G, pos)
+
+    node_index, pos_arr = _position_table(G, pos)
+    if has_routes:
+        segments, colors, widths = _route_overlay(
+            node_index, pos_arr, regular_routes, emergency_routes, regular_edges, emergency_edges
         )
 
-    # Emergency routes (green)
-    for route in emergency_routes:
-        edges = [(route[i], route[i+1]) for i in range(len(route)-1)]
-        nx.draw_networkx_edges(
-            G, pos,
-            edgelist=edges,
-            edge_color="green",
-            width=3,
-            ax=ax
+    # Scoped, not global: paths built and drawn in here are simplified
+    with matplotlib.rc_context(_FAST_RC):
+        if ax is None and fast:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=(10, 8), dpi=150)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+        elif ax is None:
+            # pyplot (and its backend) is only needed to create a figure;
+            # callers drawing into their own axes never load it
+            import matplotlib.pyplot as plt
+            # Heavy geometry is rasterized (see below); 150 dpi keeps it sharp
+            fig, ax = plt.subplots(figsize=(10, 8), dpi=150)
+        else:
+            fig = ax.figure
+
+        artists = _draw_base(ax, G, pos, node_index, pos_arr)
+
+        # Routes: a single LineCollection with per-segment colours and widths
+        if has_routes:
+            artists.append(ax.add_collection(
+                LineCollection(segments, colors=colors, linewidths=widths, zorder=1)
+            ))
+        # PDF/SVG exports embed the road geometry as one image instead of
+        # thousands of vector paths; title and text stay vector
+        for artist in artists:
+            artist.set_rasterized(True)
+
+        # Collections do not update the data limits on their own
+        ax.autoscale_view()
+
+        if fast:
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            canvas = fig.canvas if isinstance(fig.canvas, FigureCanvasAgg) else FigureCanvasAgg(fig)
+            canvas.draw()
+            return np.asarray(canvas.buffer_rgba())
+
+        ax.set_title("Green: Emergency Corridors | Blue: Regular Traffic")
+        return fig
+
+
+class TrafficVisualizer:
+    # Live view for dashboards and animations: roads and nodes are drawn
+    # once and kept as a pixel background, and update() only re-renders
+    # the routes overlay on top of it (blitting) instead of rebuilding
+    # the figure every frame
+
+    def __init__(self, G, pos=None, ax=None):
+        if pos is None:
+            pos = _cached_layout(G)
+        self.G = G
+        self.pos = pos
+        self.node_index, self.pos_arr = _position_table(G, pos)
+
+        if ax is None:
+            import matplotlib.pyplot as plt
+            self.fig, self.ax = plt.subplots(figsize=(10, 8), dpi=150)
+        else:
+            self.fig, self.ax = ax.figure, ax
+
+        with matplotlib.rc_context(_FAST_RC):
+            for artist in _draw_base(self.ax, G, pos, self.node_index, self.pos_arr):
+                artist.set_rasterized(True)
+            self.ax.autoscale_view()
+            self.ax.set_title("Green: Emergency Corridors | Blue: Regular Traffic")
+
+            # Animated artists are left out of normal draws, so the saved
+            # background never contains a stale overlay
+            self.routes = self.ax.add_collection(LineCollection([], zorder=1, animated=True))
+            self.background = None
+            # Full redraws (first show, resize) refresh the background
+            self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+            self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        canvas = self.fig.canvas
+        self.background = canvas.copy_from_bbox(self.fig.bbox)
+        self.ax.draw_artist(self.routes)
+
+    def update(self, regular_routes, emergency_routes, regular_edges=None, emergency_edges=None):
+        segments, colors, widths = _route_overlay(
+            self.node_index, self.pos_arr,
+            regular_routes, emergency_routes, regular_edges, emergency_edges
         )
+        # New paths pick up the simplification settings when built
+        with matplotlib.rc_context(_FAST_RC):
+            self.routes.set_segments(segments)
+        self.routes.set_color(colors)
+        self.routes.set_linewidths(widths)
 
-    ax.set_title("Green: Emergency Corridors | Blue: Regular Traffic")
-    return fig
-#D:\mini_project\Quantum-Traffic-Priority-Routing\visualization.py
\ No newline at end of file
+        canvas = self.fig.canvas
+        with matplotlib.rc_context(_FAST_RC):
+            canvas.restore_region(self.background)
+            self.ax.draw_artist(self.routes)
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()